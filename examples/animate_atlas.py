@@ -0,0 +1,54 @@
+import board
+import digitalio
+import gc
+import neopixel
+
+import neosprite
+
+gc.collect()
+
+# Create a button on D10
+button = digitalio.DigitalInOut(board.D10)
+button.pull = digitalio.Pull.UP
+
+# Create a NeoPixel object to control the Adafruit NeoPixel 4x8 RGB FeatherWing
+matrixSize = [8,4]
+numPixels = matrixSize[0] * matrixSize[1]
+neopixels = neopixel.NeoPixel(board.D6, numPixels, auto_write=False)
+neopixels.fill(0)
+neopixels.show()
+
+# Open the atlas built with atlas_build.py. The palette and the sprite directory are read once.
+atlas = neosprite.SpriteAtlas.open('sprites.atlas')
+
+clicked = False
+
+while True:
+  # Loop through all the sprites in the atlas
+  for name in atlas.names:
+    # Garbage collect memory from the previous sprite
+    sprite = None
+    gc.collect()
+
+    # Switching sprites only reads the pixel rows of the new sprite
+    print('\nShowing', name)
+    sprite = atlas.sprite(name)
+    sprite.size = matrixSize
+    print('mem usage:',gc.mem_alloc(),', mem free:',gc.mem_free())
+
+    play = True
+    while play:
+      # Loop through the sprite animation frames vertically
+      for yPos in range(0, sprite.bitmapHeight, sprite.size[1]):
+        sprite.offset = [0, yPos]
+        sprite.fillBuffer(neopixels.buf)
+        neopixels.show()
+
+        # Check if the button was pressed and move to the next sprite
+        if not button.value:
+          if not clicked:
+            clicked = True
+            play = False
+            break
+        else:
+          clicked = False
@@ -0,0 +1,23 @@
+# Run this on your computer to combine a folder of sprite bitmaps into one atlas file.
+# Paletted bitmaps share one palette and can't be mixed with 24 or 32bpp bitmaps.
+# Add rgbw to extract the white for RGBW pixels when the atlas is built.
+# Usage: python atlas_build.py my-sprites sprites.atlas [rgbw]
+import os
+import sys
+
+import neosprite
+
+folder = sys.argv[1]
+atlasFile = sys.argv[2]
+rgbw = len(sys.argv) > 3 and sys.argv[3] == 'rgbw'
+
+sprites = []
+for file in sorted(os.listdir(folder)):
+  if file.lower().endswith('.bmp'):
+    # Name each sprite after its file, without the extension
+    name = file[:-4]
+    sprites.append((name, neosprite.BmpSprite.open(folder + os.sep + file)))
+    print('Adding', name)
+
+neosprite.SpriteAtlas.write(atlasFile, sprites, rgbw)
+print('Wrote', len(sprites), 'sprites to', atlasFile)
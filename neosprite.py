@@ -57,8 +57,18 @@ Implementation Notes
 __version__ = "0.0.0-auto.0"
 __repo__ = "https://github.com/aaronaverill/CircuitPython_neosprite.git"
 
+import array
 import gc
 
+# Use ulab (CircuitPython) or numpy (desktop python) for the vectorized fill when available
+try:
+  from ulab import numpy as np
+except ImportError:
+  try:
+    import numpy as np
+  except ImportError:
+    np = None
+
 PixelLayout_NeoPixel_RGB = b'\x00\x01\x02\xFF\xFF'
 PixelLayout_NeoPixel_GRB = b'\x01\x00\x02\xFF\xFF'
 PixelLayout_NeoPixel_RGBW = b'\x00\x01\x02\x03\xFF'
@@ -82,19 +92,61 @@ def toInt(bytes):
     else:
       raise ValueError(4)
   return value
+
+# Read and write the unsigned little endian integers used by sprite atlas files
+def toUInt(bytes):
+  value = 0
+  for i in range(len(bytes) - 1, -1, -1):
+    value = (value << 8) + bytes[i]
+  return value
+
+def fromUInt(value, byteCount):
+  bytes = bytearray(byteCount)
+  for i in range(byteCount):
+    bytes[i] = (value >> (8 * i)) & 0xFF
+  return bytes
+
+# Move as much light as possible from the r, g, b LEDs to the white LED. whiteColor is the r, g, b
+# color of the white LED, a warmer color such as (255, 200, 150) corrects for a warm white LED.
+def extractWhite(r, g, b, whiteColor = (255, 255, 255)):
+  w = min(r * 255 // whiteColor[0], g * 255 // whiteColor[1], b * 255 // whiteColor[2], 255)
+  return (r - w * whiteColor[0] // 255, g - w * whiteColor[1] // 255, b - w * whiteColor[2] // 255, w)
+
+# Each channel of whiteColor divides in extractWhite, so it must be 1 to 255
+def checkWhiteColor(whiteColor):
+  for c in whiteColor:
+    if c < 1 or c > 255:
+      if __debug__:
+        raise ValueError('White color channels must be 1 to 255: ' + str(whiteColor))
+      else:
+        raise ValueError(12)
+
+# The reverse of extractWhite, put the white light back into r, g, b
+def addWhite(r, g, b, w, whiteColor = (255, 255, 255)):
+  return (r + w * whiteColor[0] // 255, g + w * whiteColor[1] // 255, b + w * whiteColor[2] // 255)
+
+# Convert a blue, green, red palette to blue, green, red, white
+def toRgbwPalette(palette, whiteColor = (255, 255, 255)):
+  rgbwPalette = bytearray(int(len(palette) / 3) * 4)
+  for i in range(0, int(len(palette) / 3)):
+    rgbw = extractWhite(palette[i*3+2], palette[i*3+1], palette[i*3], whiteColor)
+    rgbwPalette[i*4 : i*4 + 4] = bytes((rgbw[2], rgbw[1], rgbw[0], rgbw[3]))
+  return rgbwPalette
   
 class BmpSprite(object):
   """A sprite sourced from a BMP file"""
   
-  def open(filename):
+  # whiteColor is the color of the white LED, it is used when rgbw=True extracts the white at load.
+  # Without rgbw the RGBW fill extracts min(r, g, b) for a pure white LED.
+  def open(filename, vectorize = True, compact = False, rgbw = False, whiteColor = (255, 255, 255)):
     fp = open(filename, 'rb')
-    im = BmpSprite(fp)
+    im = BmpSprite(fp, vectorize, compact, rgbw, whiteColor)
     fp.close()
     fp = None
     gc.collect()
     return im
 
-  def __init__(self, fp):
+  def __init__(self, fp, vectorize = True, compact = False, rgbw = False, whiteColor = (255, 255, 255)):
     fp.seek(0x00)
     fileType = fp.read(2)
     if fileType != b'BM':
@@ -103,11 +155,16 @@ class BmpSprite(object):
       else:
         raise ValueError(0)
     
-    self._read(fp)
+    self._read(fp, vectorize, compact)
+    self._whiteColor = None
+    self._paletteBytes = 3
+    if rgbw:
+      checkWhiteColor(whiteColor)
+      self._prepareWhite(whiteColor)
     self.size = [self.bitmapWidth, self.bitmapHeight]
     self.offset = [0, 0]
       
-  def _read(self, fp):
+  def _read(self, fp, vectorize, compact):
     fp.seek(0x0A)
     pixelArrayOffset = toInt(fp.read(4))
     dibHeaderSize = toInt(fp.read(4))
@@ -121,8 +178,6 @@ class BmpSprite(object):
     
     if self._bitsPerPixel >= 24:
       self.palette = None
-      self.byteFillStrategy = self._f24
-      self.transformRgb = self._t24
     else:
       fp.seek(0x2E)
       paletteSize = toInt(fp.read(4))
@@ -135,18 +190,17 @@ class BmpSprite(object):
         self.palette[i : (i + 3)] = fp.read(3)
         fp.seek(1, 1)
     
-      self.byteFillStrategy = self._fP
-      self.transformRgb = self._tP
-
-    if self._bitsPerPixel < 8:
-      self._bitmapBytesPerCol = self._bitsPerPixel / 8
-    else:
-      self._bitmapBytesPerCol = int(self._bitsPerPixel / 8)
+    self._setFillStrategy(vectorize, compact)
     
     self._bitmapRowBytes = int((self._bitsPerPixel * self.bitmapWidth + 31)/32) << 2
     pixelArraySize = self._bitmapRowBytes * self.bitmapHeight
     fp.seek(pixelArrayOffset)
-    self.pixelArrayData = bytearray(fp.read(pixelArraySize))
+    if compact:
+      self._readCompact(fp, pixelArrayOffset)
+    else:
+      self.pixelArrayData = bytearray(fp.read(pixelArraySize))
+      # The stored row number of each bitmap row in the pixel array data
+      self._rowIndex = range(self.bitmapHeight)
     
     if dibHeaderSize != 40:
       if __debug__:
@@ -165,10 +219,130 @@ class BmpSprite(object):
         raise ValueError(3)
         
   
-  def fillBuffer(self, buffer, channels = PixelLayout_NeoPixel_GRB, blend = None, pixelRange = None, bufferByteStart = 0):
+  def _setFillStrategy(self, vectorize, compact):
+    if self.palette is None:
+      self.byteFillStrategy = self._f24
+      self.transformRgb = self._t24
+    else:
+      self.byteFillStrategy = self._fP
+      self.transformRgb = self._tP
+    
+    # ulab firmware builds can leave out functions. Palette lookup and compact row lookup also
+    # need an array gather, older ulab versions don't have one.
+    if (vectorize and np is not None and hasattr(np, 'frombuffer') and hasattr(np, 'minimum')
+        and ((self.palette is None and not compact) or hasattr(np, 'take'))
+        and (self._bitsPerPixel >= 8 or self._hasIntOperators())):
+      self._pythonFillStrategy = self.byteFillStrategy
+      self.byteFillStrategy = self._fV
+      self._vectorized = True
+    else:
+      self._vectorized = False
+
+    if self._bitsPerPixel < 8:
+      self._bitmapBytesPerCol = self._bitsPerPixel / 8
+    else:
+      self._bitmapBytesPerCol = int(self._bitsPerPixel / 8)
+  
+  def _hasIntOperators(self):
+    # The sub-byte unpack uses the array // and % operators which ulab builds can leave out
+    try:
+      np.zeros(1, dtype=np.uint8) // 2 % 2
+    except Exception:
+      return False
+    return True
+  
+  def _readCompact(self, fp, pixelArrayOffset):
+    # Strip the row padding and store each distinct row once. Repeated animation frames
+    # share the same rows, _rowIndex maps each bitmap row to its stored row number.
+    paddedRowBytes = self._bitmapRowBytes
+    self._bitmapRowBytes = int((self._bitsPerPixel * self.bitmapWidth + 7)/8)
+    rowBytes = self._bitmapRowBytes
+    
+    # First pass: number the distinct rows so the pixel array data is allocated once
+    rowIndex = array.array('H')
+    storedRows = {}
+    distinctRows = 0
+    for i in range(self.bitmapHeight):
+      rowData = fp.read(paddedRowBytes)[:rowBytes]
+      key = hash(rowData)
+      stored = storedRows.get(key)
+      if stored is not None:
+        # Compare with the earlier row in the file in case of a hash collision
+        fp.seek(pixelArrayOffset + stored[1] * paddedRowBytes)
+        if fp.read(rowBytes) != rowData:
+          stored = None
+        fp.seek(pixelArrayOffset + (i + 1) * paddedRowBytes)
+      if stored is None:
+        stored = (distinctRows, i)
+        distinctRows += 1
+        if key not in storedRows:
+          storedRows[key] = stored
+      rowIndex.append(stored[0])
+    storedRows = None
+    
+    # Only deduplicate when it saves more than the index costs
+    indexBytes = 1 if distinctRows < 256 else 2
+    if distinctRows * rowBytes + self.bitmapHeight * indexBytes >= self.bitmapHeight * rowBytes:
+      rowIndex = None
+      self._rowIndex = range(self.bitmapHeight)
+      distinctRows = self.bitmapHeight
+    elif indexBytes == 1:
+      self._rowIndex = array.array('B', rowIndex)
+    else:
+      self._rowIndex = rowIndex
+    
+    # Second pass: copy each distinct row the first time it appears
+    self.pixelArrayData = bytearray(distinctRows * rowBytes)
+    fp.seek(pixelArrayOffset)
+    stored = 0
+    for i in range(self.bitmapHeight):
+      rowData = fp.read(paddedRowBytes)
+      if rowIndex is None or rowIndex[i] == stored:
+        self.pixelArrayData[stored * rowBytes : (stored + 1) * rowBytes] = rowData[:rowBytes]
+        stored += 1
+      
+  def _prepareWhite(self, whiteColor):
+    # Extract the white once at load so the RGBW fill only copies the white byte
+    if self.palette is None:
+      self._storeWhite(whiteColor)
+    else:
+      self.palette = toRgbwPalette(self.palette, whiteColor)
+      self._paletteBytes = 4
+    self._whiteColor = whiteColor
+
+  def _storeWhite(self, whiteColor):
+    # Store blue, green, red, white for every pixel. 32bpp pixels already have a 4th byte.
+    data = self.pixelArrayData
+    rowBytes = self._bitmapRowBytes
+    rgbBytes = self._bitmapBytesPerCol
+    rgbwRowBytes = self.bitmapWidth * 4
+    storedRows = int(len(data) / rowBytes)
+    rgbwData = data if rgbBytes == 4 else bytearray(storedRows * rgbwRowBytes)
+    for row in range(storedRows):
+      for col in range(self.bitmapWidth):
+        i = row * rowBytes + col * rgbBytes
+        j = row * rgbwRowBytes + col * 4
+        rgbw = extractWhite(data[i+2], data[i+1], data[i], whiteColor)
+        rgbwData[j+2] = rgbw[0]
+        rgbwData[j+1] = rgbw[1]
+        rgbwData[j] = rgbw[2]
+        rgbwData[j+3] = rgbw[3]
+    
+    # The row index holds stored row numbers so it is unchanged by the wider rows
+    if rgbwData is not data:
+      self.pixelArrayData = rgbwData
+      self._bitmapRowBytes = rgbwRowBytes
+      self._bitmapBytesPerCol = 4
+      
+  def fillBuffer(self, buffer, channels = PixelLayout_NeoPixel_GRB, blend = None, pixelRange = None, bufferByteStart = 0, matrixSize = None):
     if blend is not None:
       blend = max(0, min(1, blend))
     
+    if matrixSize is not None:
+      # Tile the sprite in both dimensions over a [width, height] matrix, pixelRange is ignored
+      self._fillTiled(buffer, channels, blend, matrixSize, bufferByteStart)
+      return buffer
+
     if pixelRange is None:
       bufferLen = len(buffer)
       bufferBytesPerPixel = 4 if channels[3] != 0xFF or channels[4] != 0XFF else 3
@@ -184,17 +358,78 @@ class BmpSprite(object):
       
     return buffer
 
+  def _fillTiled(self, buffer, channels, blend, matrixSize, bufferByteStart):
+    bufferBytesPerPixel = 4 if channels[3] != 0xFF or channels[4] != 0XFF else 3
+    matrixWidth = matrixSize[0]
+    matrixHeight = matrixSize[1]
+    tileWidth = min(self.size[0], matrixWidth)
+    tileHeight = min(self.size[1], matrixHeight)
+    matrixRowBytes = matrixWidth * bufferBytesPerPixel
+    if bufferByteStart + matrixHeight * matrixRowBytes > len(buffer):
+      if __debug__:
+        raise ValueError('Matrix size ' + str(matrixWidth) + 'x' + str(matrixHeight) + ' does not fit in the buffer')
+      else:
+        raise ValueError(10)
+    
+    if self._topToBottom:
+      firstRow = self.offset[1]
+      rowStep = 1
+    else:
+      firstRow = self.bitmapHeight - self.offset[1] - 1
+      rowStep = -1
+    cols = range(self.offset[0], self.offset[0] + tileWidth)
+    
+    if blend is not None and self._vectorized and channels[4] == 0xFF:
+      # Render the tiles once, then blend the whole matrix in one array operation
+      matrixBytes = matrixHeight * matrixRowBytes
+      tiles = bytearray(matrixBytes)
+      self._fillTiled(tiles, channels, None, matrixSize, 0)
+      out = np.frombuffer(buffer, dtype=np.uint8)[bufferByteStart : bufferByteStart + matrixBytes]
+      out[:] = np.array(np.frombuffer(tiles, dtype=np.uint8) * blend + (out * (1 - blend)), dtype=np.uint8)
+      return
+    
+    if blend is not None:
+      # Blending depends on the existing buffer contents so every matrix row is rendered,
+      # the fill strategy tiles the sprite row across the matrix row
+      for y in range(matrixHeight):
+        row = firstRow + (y % tileHeight) * rowStep
+        pixelRange = (y * matrixWidth, (y + 1) * matrixWidth - 1)
+        self.byteFillStrategy(range(row, row + 1), cols, buffer, channels, blend, pixelRange, bufferByteStart)
+      return
+    
+    # Render the first tile row: one sprite row per matrix row, repeated across with doubling slice copies
+    for y in range(tileHeight):
+      row = firstRow + y * rowStep
+      pixelRange = (y * matrixWidth, y * matrixWidth + tileWidth - 1)
+      self.byteFillStrategy(range(row, row + 1), cols, buffer, channels, blend, pixelRange, bufferByteStart)
+      rowStart = bufferByteStart + y * matrixRowBytes
+      filled = tileWidth * bufferBytesPerPixel
+      while filled < matrixRowBytes:
+        count = min(filled, matrixRowBytes - filled)
+        buffer[rowStart + filled : rowStart + filled + count] = buffer[rowStart : rowStart + count]
+        filled += count
+    
+    # Reuse the first tile row for every later tile row
+    tileRowBytes = tileHeight * matrixRowBytes
+    matrixBytes = matrixHeight * matrixRowBytes
+    for start in range(tileRowBytes, matrixBytes, tileRowBytes):
+      count = min(tileRowBytes, matrixBytes - start)
+      buffer[bufferByteStart + start : bufferByteStart + start + count] = buffer[bufferByteStart : bufferByteStart + count]
+
   def _f24(self, rows, cols, buffer, channels, blend, pixelRange, bufferByteStart):
     bufferBytesPerPixel = 4 if channels[3] != 0xFF or channels[4] != 0XFF else 3
     hasWhite = channels[3] != 0xFF
     hasAlpha = channels[4] != 0XFF
+    # Sprites loaded with rgbw=True store the white after the blue, green, red bytes
+    whiteColor = self._whiteColor
+    restoreWhite = whiteColor is not None and not hasWhite
     bufferPos = bufferByteStart + pixelRange[0] * bufferBytesPerPixel
     bufferEndPos = bufferByteStart + pixelRange[1] * bufferBytesPerPixel
     bufferLen = len(buffer)
     
     while True:
       for row in rows:
-        pixelPos = row * self._bitmapRowBytes + cols[0] * self._bitmapBytesPerCol
+        pixelPos = self._rowIndex[row] * self._bitmapRowBytes + cols[0] * self._bitmapBytesPerCol
         for col in cols:
           # Extract the r, g, b data directly from the pixel array data
           r = self.pixelArrayData[pixelPos+2]
@@ -203,15 +438,24 @@ class BmpSprite(object):
           
           # Copy the r,g,b data into the buffer
           if hasWhite:
-            w = 0
-            if r == g and g == b:
-              w = r
-              r = g = b = 0
+            if whiteColor is None:
+              w = min(r, g, b)
+              r -= w
+              g -= w
+              b -= w
+            else:
+              w = self.pixelArrayData[pixelPos+3]
             if blend is not None:
               w = int(w * blend + (buffer[bufferPos+channels[3]] * (1 - blend)))
             buffer[bufferPos+channels[3]] = w
           elif hasAlpha:
             buffer[bufferPos+channels[3]] = 0xFF
+          if restoreWhite:
+            # Put the stored white back into r, g, b for pixels without a white LED
+            w = self.pixelArrayData[pixelPos+3]
+            r += w * whiteColor[0] // 255
+            g += w * whiteColor[1] // 255
+            b += w * whiteColor[2] // 255
             
           if blend is not None:
             r = int(r * blend + (buffer[bufferPos+channels[0]] * (1 - blend)))
@@ -232,9 +476,13 @@ class BmpSprite(object):
   def _t24(self, transform):
     data = self.pixelArrayData
     rgbBytes = self._bitmapBytesPerCol
-    for row in range(0,self.bitmapHeight):
+    # Transform each stored row once, compact storage shares rows between frames
+    for rowPos in range(0, len(data), self._bitmapRowBytes):
       for col in range(0,self.bitmapWidth):
-        i = row * self._bitmapRowBytes + col * rgbBytes
+        i = rowPos + col * rgbBytes
+        if self._whiteColor is not None:
+          self._transformRgbw(data, i, transform)
+          continue
         rgb = transform((data[i+2], data[i+1], data[i]))
         for p in range(len(rgb)):
           data[i+2-p] = rgb[p]
@@ -243,6 +491,9 @@ class BmpSprite(object):
     bufferBytesPerPixel = 4 if channels[3] != 0xFF or channels[4] != 0XFF else 3
     hasWhite = channels[3] != 0xFF
     hasAlpha = channels[4] != 0XFF
+    # Sprites loaded with rgbw=True store the white after the blue, green, red bytes
+    whiteColor = self._whiteColor
+    restoreWhite = whiteColor is not None and not hasWhite
     bufferPos = bufferByteStart + pixelRange[0] * bufferBytesPerPixel
     bufferEndPos = bufferByteStart + pixelRange[1] * bufferBytesPerPixel
     bufferLen = len(buffer)
@@ -257,7 +508,7 @@ class BmpSprite(object):
     while True:
       for row in rows:
         colByte = colOffset
-        pixelPos = row * self._bitmapRowBytes + colByteStart
+        pixelPos = self._rowIndex[row] * self._bitmapRowBytes + colByteStart
         for col in cols:
           if bpp == 8:
             iPalette = self.pixelArrayData[pixelPos]
@@ -273,7 +524,7 @@ class BmpSprite(object):
               colByte = 0
               pixelPos += 1
           
-          iPalette *= 3
+          iPalette *= self._paletteBytes
           # Extract the r, g, b data from the palette byte offset
           r = self.palette[iPalette+2]
           g = self.palette[iPalette+1]
@@ -281,15 +532,24 @@ class BmpSprite(object):
           
           # Copy the r,g,b data into the buffer
           if hasWhite:
-            w = 0
-            if r == g and g == b:
-              w = r
-              r = g = b = 0
+            if whiteColor is None:
+              w = min(r, g, b)
+              r -= w
+              g -= w
+              b -= w
+            else:
+              w = self.palette[iPalette+3]
             if blend is not None:
               w = int(w * blend + (buffer[bufferPos+channels[3]] * (1 - blend)))
             buffer[bufferPos+channels[3]] = w
           elif hasAlpha:
             buffer[bufferPos+channels[3]] = 0xFF
+          if restoreWhite:
+            # Put the stored white back into r, g, b for pixels without a white LED
+            w = self.palette[iPalette+3]
+            r += w * whiteColor[0] // 255
+            g += w * whiteColor[1] // 255
+            b += w * whiteColor[2] // 255
 
           if blend is not None:
             r = int(r * blend + (buffer[bufferPos+channels[0]] * (1 - blend)))
@@ -306,10 +566,325 @@ class BmpSprite(object):
           if (bufferPos >= bufferLen):
             bufferPos = 0
     
+  def _fV(self, rows, cols, buffer, channels, blend, pixelRange, bufferByteStart):
+    hasWhite = channels[3] != 0xFF
+    hasAlpha = channels[4] != 0XFF
+    if hasAlpha:
+      # The alpha byte is written pixel by pixel, leave this to the python fill
+      return self._pythonFillStrategy(rows, cols, buffer, channels, blend, pixelRange, bufferByteStart)
+    bufferBytesPerPixel = 4 if hasWhite else 3
+    bufferPos = bufferByteStart + pixelRange[0] * bufferBytesPerPixel
+    bufferEndPos = bufferByteStart + pixelRange[1] * bufferBytesPerPixel
+    bufferLen = len(buffer)
+    
+    # Gather the whole sprite frame as r, g, b arrays in fill order, w is the stored white or None
+    if self.palette is None:
+      b, g, r, w = self._gV24(rows, cols)
+    else:
+      b, g, r, w = self._gVP(rows, cols)
+    if hasWhite:
+      if w is None:
+        w = np.minimum(np.minimum(r, g), b)
+        r = r - w
+        g = g - w
+        b = b - w
+      colors = ((channels[3], w), (channels[0], r), (channels[1], g), (channels[2], b))
+    else:
+      if w is not None:
+        # Put the stored white back into r, g, b for pixels without a white LED
+        w = np.array(w, dtype=np.uint16)
+        whiteColor = self._whiteColor
+        r = r + w * whiteColor[0] // 255
+        g = g + w * whiteColor[1] // 255
+        b = b + w * whiteColor[2] // 255
+      colors = ((channels[0], r), (channels[1], g), (channels[2], b))
+    
+    out = np.frombuffer(buffer, dtype=np.uint8)
+    spritePixels = len(r)
+    spritePos = 0
+    while True:
+      # Fill the longest run of pixels without wrapping the buffer or the sprite
+      if bufferEndPos >= bufferPos:
+        runEndPos = bufferEndPos
+      else:
+        runEndPos = bufferLen - bufferBytesPerPixel
+      count = min(int((runEndPos - bufferPos) / bufferBytesPerPixel) + 1, spritePixels - spritePos)
+      runStop = bufferPos + count * bufferBytesPerPixel
+      for channel, data in colors:
+        data = data[spritePos : spritePos + count]
+        if blend is not None:
+          data = np.array(data * blend + (out[bufferPos + channel : runStop : bufferBytesPerPixel] * (1 - blend)), dtype=np.uint8)
+        out[bufferPos + channel : runStop : bufferBytesPerPixel] = data
+      
+      bufferPos = runStop - bufferBytesPerPixel
+      if bufferPos == bufferEndPos:
+        return
+      bufferPos += bufferBytesPerPixel
+      if (bufferPos >= bufferLen):
+        bufferPos = 0
+      spritePos += count
+      if spritePos >= spritePixels:
+        spritePos = 0
+  
+  def _gVRows(self, rows, cols, colBytes):
+    # Slice the rows of the frame and the bytes holding the columns out of the pixel array data
+    rowBytes = self._bitmapRowBytes
+    data = np.frombuffer(self.pixelArrayData, dtype=np.uint8)
+    data = data.reshape((int(len(self.pixelArrayData) / rowBytes), rowBytes))
+    rowStep = 1 if self._topToBottom else -1
+    rowStop = rows[0] + len(rows) * rowStep
+    if rowStop < 0:
+      rowStop = None
+    if isinstance(self._rowIndex, range):
+      return data[rows[0] : rowStop : rowStep, colBytes[0] : colBytes[1]]
+    # Compact storage, gather the stored rows through the row index
+    rowIndex = np.frombuffer(self._rowIndex, dtype=np.uint8 if data.shape[0] < 256 else np.uint16)
+    return np.take(data, rowIndex[rows[0] : rowStop : rowStep], axis=0)[:, colBytes[0] : colBytes[1]]
+
+  def _gV24(self, rows, cols):
+    bpc = self._bitmapBytesPerCol
+    frame = self._gVRows(rows, cols, (cols[0] * bpc, (cols[0] + len(cols)) * bpc))
+    w = frame[:, 3::bpc].flatten() if self._whiteColor is not None else None
+    return (frame[:, 0::bpc].flatten(), frame[:, 1::bpc].flatten(), frame[:, 2::bpc].flatten(), w)
+
+  def _gVP(self, rows, cols):
+    bpp = self._bitsPerPixel
+    if bpp == 8:
+      iPalette = self._gVRows(rows, cols, (cols[0], cols[0] + len(cols))).flatten()
+    else:
+      # Unpack the sub-byte pixels, one strided column slice for each position in the byte
+      modulo = int(8 / bpp)
+      byteStart = int(cols[0] / modulo)
+      frame = self._gVRows(rows, cols, (byteStart, int((cols[0] + len(cols) - 1) / modulo) + 1))
+      iPalette = np.zeros((len(rows), len(cols)), dtype=np.uint8)
+      for col in range(min(modulo, len(cols))):
+        bitshift = bpp * (modulo - 1 - (cols[0] + col) % modulo)
+        byteCol = int((cols[0] + col) / modulo) - byteStart
+        count = len(range(col, len(cols), modulo))
+        iPalette[:, col::modulo] = frame[:, byteCol : byteCol + count] // (1 << bitshift) % (1 << bpp)
+      iPalette = iPalette.flatten()
+    palette = np.frombuffer(self.palette, dtype=np.uint8)
+    stride = self._paletteBytes
+    w = np.take(palette[3::stride], iPalette) if self._whiteColor is not None else None
+    return (np.take(palette[0::stride], iPalette), np.take(palette[1::stride], iPalette), np.take(palette[2::stride], iPalette), w)
+    
   def _tP(self, transform):
     data = self.palette
-    rgbBytes = 3
+    rgbBytes = self._paletteBytes
     for i in range(0, len(data), rgbBytes):
+      if self._whiteColor is not None:
+        self._transformRgbw(data, i, transform)
+        continue
       rgb = transform((data[i+2], data[i+1], data[i]))
       for p in range(len(rgb)):
-        data[i+2-p] = rgb[p]
\ No newline at end of file
+        data[i+2-p] = rgb[p]
+
+  def _transformRgbw(self, data, i, transform):
+    # Transform the full color then extract the white again
+    whiteColor = self._whiteColor
+    rgb = transform(addWhite(data[i+2], data[i+1], data[i], data[i+3], whiteColor))
+    rgbw = extractWhite(rgb[0], rgb[1], rgb[2], whiteColor)
+    data[i+2] = rgbw[0]
+    data[i+1] = rgbw[1]
+    data[i] = rgbw[2]
+    data[i+3] = rgbw[3]
+
+class AtlasSprite(BmpSprite):
+  """A sprite loaded from a SpriteAtlas. Paletted sprites share the atlas palette."""
+
+  def __init__(self, fp, bitsPerPixel, palette, width, height, pixelArrayOffset, vectorize = True, whiteColor = None):
+    self._bitsPerPixel = bitsPerPixel
+    self.palette = palette
+    self.bitmapWidth = width
+    self.bitmapHeight = height
+    self._topToBottom = True
+    self._setFillStrategy(vectorize, False)
+    
+    self._whiteColor = whiteColor
+    self._paletteBytes = 3
+    storedBitsPerPixel = bitsPerPixel
+    if whiteColor is not None:
+      # The atlas was written with the white extracted, into the palette or a 4th byte per pixel
+      if palette is None:
+        self._bitmapBytesPerCol = 4
+        storedBitsPerPixel = 32
+      else:
+        self._paletteBytes = 4
+    
+    # Atlas rows are stored top to bottom without padding
+    self._bitmapRowBytes = int((storedBitsPerPixel * width + 7)/8)
+    pixelArraySize = self._bitmapRowBytes * height
+    fp.seek(pixelArrayOffset)
+    self.pixelArrayData = bytearray(fp.read(pixelArraySize))
+    self._rowIndex = range(height)
+    
+    self.size = [self.bitmapWidth, self.bitmapHeight]
+    self.offset = [0, 0]
+
+class SpriteAtlas(object):
+  """Many named sprites in one file with a shared palette. Sprite pixels are read on demand.
+  
+  The file layout, all integers are unsigned little endian:
+  
+  * 'NA' file type, bits per pixel (2 bytes), palette colors (2 bytes), sprite count (2 bytes)
+  * The white LED color, red, green, blue (3 bytes). 0, 0, 0 unless the atlas was written with rgbw.
+  * The palette, 3 bytes blue, green, red per color, or 4 bytes blue, green, red, white with rgbw.
+    There is no palette for 24 and 32bpp, their pixels are 4 bytes blue, green, red, white with rgbw.
+  * The directory, per sprite: name length in bytes (1 byte), utf-8 name, width (2 bytes),
+    height (2 bytes), file offset of the pixel rows (4 bytes)
+  * The pixel rows of each sprite, top to bottom without row padding
+  """
+
+  def open(filename, vectorize = True):
+    fp = open(filename, 'rb')
+    return SpriteAtlas(fp, vectorize)
+
+  def __init__(self, fp, vectorize = True):
+    fp.seek(0x00)
+    fileType = fp.read(2)
+    if fileType != b'NA':
+      if __debug__:
+        raise ValueError('Not a sprite atlas file.')
+      else:
+        raise ValueError(5)
+    
+    self._fp = fp
+    self._vectorize = vectorize
+    self._bitsPerPixel = toUInt(fp.read(2))
+    paletteSize = toUInt(fp.read(2))
+    spriteCount = toUInt(fp.read(2))
+    whiteColor = tuple(fp.read(3))
+    self._whiteColor = whiteColor if whiteColor != (0, 0, 0) else None
+    # The palette is read once and shared by every sprite
+    paletteBytes = 3 if self._whiteColor is None else 4
+    self.palette = bytearray(fp.read(paletteSize * paletteBytes)) if paletteSize else None
+    
+    self.names = []
+    self._directory = {}
+    for i in range(spriteCount):
+      name = fp.read(toUInt(fp.read(1))).decode()
+      self.names.append(name)
+      self._directory[name] = (toUInt(fp.read(2)), toUInt(fp.read(2)), toUInt(fp.read(4)))
+
+  def close(self):
+    self._fp.close()
+    self._fp = None
+
+  def sprite(self, name):
+    # Switching sprites is a seek and a read, the file stays open and the palette is already loaded
+    if name not in self._directory:
+      if __debug__:
+        raise ValueError('Sprite not found: ' + name)
+      else:
+        raise ValueError(6)
+    width, height, pixelArrayOffset = self._directory[name]
+    return AtlasSprite(self._fp, self._bitsPerPixel, self.palette, width, height, pixelArrayOffset, self._vectorize, self._whiteColor)
+
+  def write(filename, sprites, rgbw = False, whiteColor = (255, 255, 255)):
+    """Write a list of (name, sprite) to an atlas file. Paletted sprites are remapped to one shared
+    palette at the largest bits per pixel, they can't be mixed with 24 or 32bpp sprites.
+    With rgbw the white is extracted here, like BmpSprite.open() does at load, so sprites read from
+    the atlas don't repeat the work. This is intended to run on a computer."""
+    if rgbw:
+      checkWhiteColor(whiteColor)
+    else:
+      whiteColor = None
+    bitsPerPixel = 0
+    for name, sprite in sprites:
+      bitsPerPixel = max(bitsPerPixel, sprite._bitsPerPixel)
+    palette = bytearray()
+    colors = {}
+    entries = []
+    for name, sprite in sprites:
+      if sprite._whiteColor is not None:
+        if __debug__:
+          raise ValueError('Cannot write a sprite loaded with rgbw: ' + name)
+        else:
+          raise ValueError(9)
+      if sprite._bitsPerPixel != bitsPerPixel and (sprite.palette is None or bitsPerPixel >= 24):
+        if __debug__:
+          raise ValueError('Cannot mix ' + str(bitsPerPixel) + ' and ' + str(sprite._bitsPerPixel) + ' bits per pixel')
+        else:
+          raise ValueError(7)
+      nameBytes = name.encode()
+      if len(nameBytes) > 255:
+        if __debug__:
+          raise ValueError('Sprite name is longer than 255 bytes: ' + name)
+        else:
+          raise ValueError(11)
+      
+      rowBytes = int((bitsPerPixel * sprite.bitmapWidth + 7)/8)
+      if sprite._topToBottom:
+        rows = range(sprite.bitmapHeight)
+      else:
+        rows = range(sprite.bitmapHeight - 1, -1, -1)
+      
+      pixelArrayData = bytearray()
+      for row in rows:
+        pixelPos = sprite._rowIndex[row] * sprite._bitmapRowBytes
+        rowData = sprite.pixelArrayData[pixelPos : pixelPos + rowBytes]
+        if sprite.palette is not None:
+          rowData = SpriteAtlas._remapRow(rowData, sprite, bitsPerPixel, palette, colors)
+        elif whiteColor is not None:
+          rowData = SpriteAtlas._whiteRow(rowData, sprite, whiteColor)
+        pixelArrayData.extend(rowData)
+      entries.append((nameBytes, sprite.bitmapWidth, sprite.bitmapHeight, pixelArrayData))
+    
+    if whiteColor is not None and len(palette):
+      palette = toRgbwPalette(palette, whiteColor)
+    
+    directorySize = 0
+    for entry in entries:
+      directorySize += 9 + len(entry[0])
+    pixelArrayOffset = 11 + len(palette) + directorySize
+    
+    fp = open(filename, 'wb')
+    fp.write(b'NA')
+    fp.write(fromUInt(bitsPerPixel, 2))
+    fp.write(fromUInt(int(len(palette) / (3 if whiteColor is None else 4)), 2))
+    fp.write(fromUInt(len(entries), 2))
+    fp.write(bytes(whiteColor) if whiteColor is not None else bytes(3))
+    fp.write(palette)
+    for nameBytes, width, height, pixelArrayData in entries:
+      fp.write(fromUInt(len(nameBytes), 1))
+      fp.write(nameBytes)
+      fp.write(fromUInt(width, 2))
+      fp.write(fromUInt(height, 2))
+      fp.write(fromUInt(pixelArrayOffset, 4))
+      pixelArrayOffset += len(pixelArrayData)
+    for entry in entries:
+      fp.write(entry[3])
+    fp.close()
+
+  def _whiteRow(rowData, sprite, whiteColor):
+    # Store blue, green, red, white for each pixel
+    rgbBytes = sprite._bitmapBytesPerCol
+    rgbwRow = bytearray(sprite.bitmapWidth * 4)
+    for col in range(sprite.bitmapWidth):
+      i = col * rgbBytes
+      rgbw = extractWhite(rowData[i+2], rowData[i+1], rowData[i], whiteColor)
+      rgbwRow[col*4 : col*4 + 4] = bytes((rgbw[2], rgbw[1], rgbw[0], rgbw[3]))
+    return rgbwRow
+
+  def _remapRow(rowData, sprite, bitsPerPixel, palette, colors):
+    # Replace each palette index with the index of the same color in the shared palette
+    bpp = sprite._bitsPerPixel
+    modulo = int(8 / bpp)
+    bitMask = 2**bpp - 1
+    atlasModulo = int(8 / bitsPerPixel)
+    remapped = bytearray(int((bitsPerPixel * sprite.bitmapWidth + 7)/8))
+    for col in range(sprite.bitmapWidth):
+      bitshift = bpp * (modulo - 1 - col % modulo)
+      iPalette = (rowData[int(col / modulo)] >> bitshift) & bitMask
+      color = bytes(sprite.palette[iPalette * 3 : iPalette * 3 + 3])
+      if color not in colors:
+        if len(colors) >= 1 << bitsPerPixel:
+          if __debug__:
+            raise ValueError('Too many colors for a shared ' + str(bitsPerPixel) + ' bits per pixel palette')
+          else:
+            raise ValueError(8)
+        colors[color] = len(colors)
+        palette.extend(color)
+      bitshift = bitsPerPixel * (atlasModulo - 1 - col % atlasModulo)
+      remapped[int(col / atlasModulo)] |= colors[color] << bitshift
+    return remapped
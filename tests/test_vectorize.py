@@ -0,0 +1,59 @@
+# Checks the numpy vectorized fill against the python fill, run on a computer with:
+# python -m pytest tests
+import glob
+import os
+import sys
+
+import pytest
+
+pytest.importorskip('numpy')
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import neosprite
+
+spriteFiles = sorted(glob.glob(os.path.join(os.path.dirname(__file__), '..', 'examples', 'sprites', 'test', '*.bmp')))
+
+layouts = [name for name in dir(neosprite) if name.startswith('PixelLayout_')]
+
+def openSprite(filename, **options):
+  try:
+    return neosprite.BmpSprite.open(filename, **options)
+  except ValueError:
+    pytest.skip('Bitmap format not supported')
+
+@pytest.mark.parametrize('options', [{}, {'compact': True}, {'rgbw': True}, {'rgbw': True, 'whiteColor': (255, 200, 150)}])
+@pytest.mark.parametrize('blend', [None, 0.4])
+@pytest.mark.parametrize('layout', layouts)
+@pytest.mark.parametrize('filename', spriteFiles, ids=os.path.basename)
+def test_vectorized_fill_matches_python_fill(filename, layout, blend, options):
+  vectorized = openSprite(filename, vectorize=True, **options)
+  python = openSprite(filename, vectorize=False, **options)
+  assert vectorized.byteFillStrategy.__name__ == '_fV'
+
+  channels = getattr(neosprite, layout)
+  bytesPerPixel = 4 if channels[3] != 0xFF or channels[4] != 0xFF else 3
+  bufferPixels = 60
+  # (size, offset, pixelRange, matrixSize)
+  cases = [
+    (None, None, (0, 39), None),
+    ([1, 5], [2, 0], (5, 20), None),
+    ([4, 4], [0, 2], None, [10, 6]),
+  ]
+  if channels[4] == 0xFF:
+    # Wrap around the end of the buffer
+    cases.append(([3, 2], [1, 1], (30, 4), None))
+  else:
+    # DotStar layouts write their alpha byte 255 bytes past the pixel, leave room for that
+    bufferPixels += 86
+  for size, offset, pixelRange, matrixSize in cases:
+    if size and (offset[0] + size[0] > python.bitmapWidth or offset[1] + size[1] > python.bitmapHeight):
+      continue
+    for sprite in (vectorized, python):
+      sprite.size = size or [sprite.bitmapWidth, sprite.bitmapHeight]
+      sprite.offset = offset or [0, 0]
+    initial = bytes((i * 7) % 256 for i in range(bytesPerPixel * bufferPixels))
+    expected = bytearray(initial)
+    actual = bytearray(initial)
+    python.fillBuffer(expected, channels, blend=blend, pixelRange=pixelRange, matrixSize=matrixSize)
+    vectorized.fillBuffer(actual, channels, blend=blend, pixelRange=pixelRange, matrixSize=matrixSize)
+    assert actual == expected, (size, offset, pixelRange, matrixSize)